@@ -10,10 +10,23 @@ from db import (get_usage_type, list_usages_for_user, retrieve_usage,
                 add_usage, update_usage, delete_usage, get_all_usage_types)
 from errors import ResourceNotFoundException
 from auth import validate_token, TokenData
+from profiling import (PROFILING_TOKEN, PROFILING_INTERVAL,
+                       PROFILING_MIN_INTERVAL, PROFILING_OUTPUT_DIR,
+                       ProfilingMiddleware)
 
 
 app = FastAPI()
 
+# per-request profiling is opt-in and stays out of the stack if disabled
+if PROFILING_TOKEN:
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=PROFILING_TOKEN,
+        interval=PROFILING_INTERVAL,
+        min_interval=PROFILING_MIN_INTERVAL,
+        output_dir=PROFILING_OUTPUT_DIR,
+    )
+
 
 # CRUD operations here...
 
@@ -2,8 +2,8 @@
 import os
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel
 from jose import JWTError, jwt
+from models import TokenData
 
 SECRET_KEY = os.getenv("SECRET")
 ALGORITHM = "HS256"
@@ -12,11 +12,6 @@ AUDIENCE = "fastapi-users:auth"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=os.getenv("AUTH_ENDPOINT"))
 
 
-# TODO: refactor: move TokenData to .models
-class TokenData(BaseModel):
-    user_id: str = ...
-
-
 async def validate_token(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,89 +1,43 @@
 import os
-from bson.objectid import ObjectId
-import motor.motor_asyncio
-from models import UsageStorageModel
-from errors import ResourceNotFoundException
-from auth import TokenData
+from storage import BaseUsageStorage
 
+"""
+Selects the storage engine from the STORAGE_BACKEND env variable:
+
+  * `mongo` (default) - MongoDB via Motor, see MONGO_HOST and MONGO_PORT
+  * `sqlite` - embedded SQLite database stored at SQLITE_PATH
+"""
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
 
 mongo_host = os.getenv('MONGO_HOST')
 mongo_port = os.getenv('MONGO_PORT')
 
 DATABASE_URL = f"mongodb://{mongo_host}:{mongo_port}"
 
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'carbon.db')
+SQLITE_WORKERS = int(os.getenv('SQLITE_WORKERS', '4'))
 
-client = motor.motor_asyncio.AsyncIOMotorClient(
-    DATABASE_URL,
-    uuidRepresentation="standard"
-)
-database = client.carbon
-usage_collection = database.get_collection("usage_collection")
-usage_type_collection = database.get_collection("usage_type_collection")
-
-
-async def get_usage_type(usage_type_id: int):
-    """Get usage for usage type"""
-    return await usage_type_collection.find_one({"id": usage_type_id})
-
-
-async def get_all_usage_types(limit: int, offset: int):
-    """Get all usage types"""
-    cursor = usage_type_collection.find().limit(limit).skip(offset)
-    items = await cursor.to_list(limit)
-    return items
-
-
-async def list_usages_for_user(user_id: int, limit: int, offset: int):
-    """Retrieve all usages present in the database for a certain user"""
-    cursor = usage_collection.find({"user_id": str(user_id)}).limit(limit).skip(offset)
-    items = await cursor.to_list(limit)
-    return items
-
-
-async def add_usage(usage_data: UsageStorageModel) -> dict:
-    """Add a new usage into to the database"""
-    usage = await usage_collection.insert_one(usage_data.dict())
-    return await usage_collection.find_one({"_id": usage.inserted_id})
-
-
-async def retrieve_usage(id: ObjectId, token: TokenData) -> dict:
-    """Retrieve a usage with a matching ID"""
-    return await usage_collection.find_one(
-        {"_id": id, "user_id": token.user_id})
-
-
-async def update_usage(id: ObjectId, data: dict, token: TokenData) -> dict:
-    """Update certain values and return the new object"""
-    usage = await usage_collection.find_one(
-        {"_id": id, "user_id": token.user_id})
-    if not usage:
-        # usage not found in DB
-        raise ResourceNotFoundException("Resource not found in DB")
-
-    # we don't want Nones in the update set, since it would override data
-    data = {k: v for k, v in data.items() if v is not None}
-
-    await usage_collection.update_one(
-        {"_id": id}, {"$set": data}
-    )
-    return await usage_collection.find_one({"_id": id})
 
+def get_storage(backend: str) -> BaseUsageStorage:
+    """Create the storage engine - drivers are only imported when used"""
+    if backend == 'mongo':
+        from storage_mongo import MongoUsageStorage
+        return MongoUsageStorage(DATABASE_URL)
+    if backend == 'sqlite':
+        from storage_sqlite import SQLiteUsageStorage
+        return SQLiteUsageStorage(SQLITE_PATH, workers=SQLITE_WORKERS)
+    raise ValueError(f"Unknown storage backend '{backend}'")
 
-async def delete_usage(id: ObjectId) -> int:
-    """Delete usage from the database"""
-    usage = await usage_collection.find_one({"_id": id})
-    if not usage:
-        raise ResourceNotFoundException("Resource not found in DB")
-    res = await usage_collection.delete_one({"_id": id})
-    return res.deleted_count
 
+storage = get_storage(STORAGE_BACKEND)
 
-async def delete_usage_for_user(id: ObjectId, token: TokenData):
-    """Delete usage but only if users also owns the resource"""
-    usage = await usage_collection.find_one(
-        {"_id": id, "user_id": token.user_id}
-    )
-    if not usage:
-        raise ResourceNotFoundException("Resource not found in DB")
-    res = await usage_collection.delete_one({"_id": id})
-    return res.deleted_count
+get_usage_type = storage.get_usage_type
+get_all_usage_types = storage.get_all_usage_types
+add_usage_types = storage.add_usage_types
+list_usages_for_user = storage.list_usages_for_user
+add_usage = storage.add_usage
+retrieve_usage = storage.retrieve_usage
+update_usage = storage.update_usage
+delete_usage = storage.delete_usage
+delete_usage_for_user = storage.delete_usage_for_user
@@ -25,6 +25,10 @@ class User(BaseModel):
     user_id: int
 
 
+class TokenData(BaseModel):
+    user_id: str = ...
+
+
 class UsageTypeModel(BaseModel):
     id: int
     name: str
@@ -0,0 +1,95 @@
+import os
+import hmac
+import time
+from uuid import uuid4
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response
+
+"""
+On-demand profiling of single requests.
+
+The middleware is only installed when PROFILING_TOKEN is set, so it costs
+nothing in normal operation. A request is profiled if it carries the header
+`X-Profile: <PROFILING_TOKEN>`. Profiling is rate limited to one request
+every PROFILING_MIN_INTERVAL seconds - other requests are served normally.
+"""
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_HEADER = "X-Profile"
+# sampling interval of the profiler in seconds
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.001"))
+# minimum time in seconds between two profiled requests
+PROFILING_MIN_INTERVAL = float(os.getenv("PROFILING_MIN_INTERVAL", "10"))
+# if set, profiles are written here instead of being returned to the client
+PROFILING_OUTPUT_DIR = os.getenv("PROFILING_OUTPUT_DIR")
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """Wrap a single request in a pyinstrument sampling profiler"""
+
+    def __init__(self, app, token: str, interval: float = 0.001,
+                 min_interval: float = 10.0, output_dir: str = None):
+        super().__init__(app)
+        # import here - pyinstrument is only needed if profiling is on
+        from pyinstrument import Profiler
+        self.profiler_cls = Profiler
+        self.token = token
+        self.interval = interval
+        self.min_interval = min_interval
+        self.output_dir = output_dir
+        if output_dir:
+            # fail on startup, not on the first profiled request
+            os.makedirs(output_dir, exist_ok=True)
+        self.last_profiled_at = None
+
+    def _should_profile(self, request: Request) -> bool:
+        provided = request.headers.get(PROFILING_HEADER)
+        # compare bytes - compare_digest rejects non-ASCII strings
+        if not provided or not hmac.compare_digest(provided.encode(),
+                                                   self.token.encode()):
+            return False
+        now = time.monotonic()
+        if (self.last_profiled_at is not None
+                and now - self.last_profiled_at < self.min_interval):
+            return False
+        self.last_profiled_at = now
+        return True
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        if not self._should_profile(request):
+            return await call_next(request)
+
+        # only charge the profiled request, including the time it awaits
+        profiler = self.profiler_cls(interval=self.interval,
+                                     async_mode="enabled")
+        profiler.start()
+        try:
+            response = await call_next(request)
+            # drain the body, so encoding is part of the profile, too
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        finally:
+            profiler.stop()
+
+        if not self.output_dir:
+            return HTMLResponse(profiler.output_html())
+
+        headers = dict(response.headers)
+        headers.pop("content-length", None)
+        profile_id = str(uuid4())
+        try:
+            await run_in_threadpool(self._write_profile, profile_id,
+                                    profiler.output_html())
+        except OSError as e:
+            # the profile is lost, but the request still gets its response
+            print(f"Could not store profile {profile_id}: {e}")
+        else:
+            headers["X-Profile-Id"] = profile_id
+        return Response(body, status_code=response.status_code,
+                        headers=headers, media_type=response.media_type)
+
+    def _write_profile(self, profile_id: str, html: str):
+        path = os.path.join(self.output_dir, f"{profile_id}.html")
+        with open(path, "w") as f:
+            f.write(html)
@@ -0,0 +1,79 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from bson.objectid import ObjectId
+from models import UsageStorageModel, TokenData
+
+# fields of a usage that update_usage may change
+UPDATABLE_FIELDS = ("amount", "usage_type")
+
+
+def get_update_set(data: dict) -> dict:
+    """Validate the fields to update and drop the ones set to None"""
+    unsupported = set(data) - set(UPDATABLE_FIELDS)
+    if unsupported:
+        raise ValueError(f"Can't update {', '.join(sorted(unsupported))}")
+    # we don't want Nones in the update set, since it would override data
+    return {k: v for k, v in data.items() if v is not None}
+
+
+class BaseUsageStorage(ABC):
+    """
+    Interface of a storage engine for usages and usage types.
+
+    Usages are returned as dicts in the shape of `UsageResponseModel`,
+    usage types in the shape of `UsageTypeModel`.
+    """
+
+    @abstractmethod
+    async def get_usage_type(self, usage_type_id: int) -> Optional[dict]:
+        """Get usage for usage type"""
+        pass
+
+    @abstractmethod
+    async def get_all_usage_types(self, limit: int, offset: int) -> List[dict]:
+        """Get all usage types"""
+        pass
+
+    @abstractmethod
+    async def add_usage_types(self, usage_types: List[dict]) -> None:
+        """Add usage types to the database"""
+        pass
+
+    @abstractmethod
+    async def list_usages_for_user(self, user_id: int, limit: int,
+                                   offset: int) -> List[dict]:
+        """Retrieve all usages present in the database for a certain user"""
+        pass
+
+    @abstractmethod
+    async def add_usage(self, usage_data: UsageStorageModel) -> dict:
+        """Add a new usage into to the database"""
+        pass
+
+    @abstractmethod
+    async def retrieve_usage(self, id: ObjectId,
+                             token: TokenData) -> Optional[dict]:
+        """Retrieve a usage with a matching ID"""
+        pass
+
+    @abstractmethod
+    async def update_usage(self, id: ObjectId, data: dict,
+                           token: TokenData) -> dict:
+        """Update certain values and return the new object.
+        Only UPDATABLE_FIELDS can be changed, None values are ignored."""
+        pass
+
+    @abstractmethod
+    async def delete_usage(self, id: ObjectId) -> int:
+        """Delete usage from the database"""
+        pass
+
+    @abstractmethod
+    async def delete_usage_for_user(self, id: ObjectId,
+                                    token: TokenData) -> int:
+        """Delete usage but only if users also owns the resource"""
+        pass
+
+    def close(self) -> None:
+        """Release connections held by the storage"""
+        pass
@@ -0,0 +1,78 @@
+from typing import List
+from bson.objectid import ObjectId
+import motor.motor_asyncio
+from models import UsageStorageModel, TokenData
+from errors import ResourceNotFoundException
+from storage import BaseUsageStorage, get_update_set
+
+
+class MongoUsageStorage(BaseUsageStorage):
+    """Storage engine using MongoDB via Motor"""
+
+    def __init__(self, database_url: str):
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(
+            database_url,
+            uuidRepresentation="standard"
+        )
+        database = self.client.carbon
+        self.usage_collection = database.get_collection("usage_collection")
+        self.usage_type_collection = database.get_collection(
+            "usage_type_collection")
+
+    async def get_usage_type(self, usage_type_id: int):
+        return await self.usage_type_collection.find_one({"id": usage_type_id})
+
+    async def get_all_usage_types(self, limit: int, offset: int):
+        cursor = self.usage_type_collection.find().limit(limit).skip(offset)
+        items = await cursor.to_list(limit)
+        return items
+
+    async def add_usage_types(self, usage_types: List[dict]):
+        await self.usage_type_collection.insert_many(usage_types)
+
+    async def list_usages_for_user(self, user_id: int, limit: int, offset: int):
+        cursor = self.usage_collection.find(
+            {"user_id": str(user_id)}).limit(limit).skip(offset)
+        items = await cursor.to_list(limit)
+        return items
+
+    async def add_usage(self, usage_data: UsageStorageModel) -> dict:
+        usage = await self.usage_collection.insert_one(usage_data.dict())
+        return await self.usage_collection.find_one({"_id": usage.inserted_id})
+
+    async def retrieve_usage(self, id: ObjectId, token: TokenData) -> dict:
+        return await self.usage_collection.find_one(
+            {"_id": id, "user_id": token.user_id})
+
+    async def update_usage(self, id: ObjectId, data: dict,
+                           token: TokenData) -> dict:
+        data = get_update_set(data)
+        usage = await self.usage_collection.find_one(
+            {"_id": id, "user_id": token.user_id})
+        if not usage:
+            # usage not found in DB
+            raise ResourceNotFoundException("Resource not found in DB")
+
+        await self.usage_collection.update_one(
+            {"_id": id}, {"$set": data}
+        )
+        return await self.usage_collection.find_one({"_id": id})
+
+    async def delete_usage(self, id: ObjectId) -> int:
+        usage = await self.usage_collection.find_one({"_id": id})
+        if not usage:
+            raise ResourceNotFoundException("Resource not found in DB")
+        res = await self.usage_collection.delete_one({"_id": id})
+        return res.deleted_count
+
+    async def delete_usage_for_user(self, id: ObjectId, token: TokenData):
+        usage = await self.usage_collection.find_one(
+            {"_id": id, "user_id": token.user_id}
+        )
+        if not usage:
+            raise ResourceNotFoundException("Resource not found in DB")
+        res = await self.usage_collection.delete_one({"_id": id})
+        return res.deleted_count
+
+    def close(self):
+        self.client.close()
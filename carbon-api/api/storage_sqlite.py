@@ -0,0 +1,219 @@
+import json
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from bson.objectid import ObjectId
+from models import UsageStorageModel, UsageTypeModel, TokenData
+from errors import ResourceNotFoundException
+from storage import BaseUsageStorage, get_update_set
+
+"""
+Embedded storage engine for single node installs.
+
+sqlite3 is blocking, so every call runs in a small thread pool. Each worker
+thread owns one connection; the connections run in WAL mode, so readers
+don't wait for writers. All statements are constant and parameterized,
+which lets sqlite3 reuse its prepared statements (statement cache).
+"""
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS usage_type (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        unit TEXT NOT NULL,
+        factor REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS usage (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        amount REAL NOT NULL,
+        usage_type TEXT NOT NULL,
+        usage_at TEXT NOT NULL
+    )""",
+    # the implicit rowid makes this index also serve the insertion order
+    "CREATE INDEX IF NOT EXISTS usage_user_id_idx ON usage (user_id)",
+]
+
+SELECT_USAGE_TYPE = "SELECT id, name, unit, factor FROM usage_type WHERE id = ?"
+SELECT_USAGE_TYPES = ("SELECT id, name, unit, factor FROM usage_type "
+                      "ORDER BY id LIMIT ? OFFSET ?")
+INSERT_USAGE_TYPE = ("INSERT OR REPLACE INTO usage_type (id, name, unit, factor) "
+                     "VALUES (:id, :name, :unit, :factor)")
+SELECT_USAGE = ("SELECT id, user_id, amount, usage_type, usage_at FROM usage "
+                "WHERE id = ?")
+SELECT_USAGE_FOR_USER = ("SELECT id, user_id, amount, usage_type, usage_at "
+                         "FROM usage WHERE id = ? AND user_id = ?")
+SELECT_USAGES_FOR_USER = ("SELECT id, user_id, amount, usage_type, usage_at "
+                          "FROM usage WHERE user_id = ? "
+                          "ORDER BY rowid LIMIT ? OFFSET ?")
+INSERT_USAGE = ("INSERT INTO usage (id, user_id, amount, usage_type, usage_at) "
+                "VALUES (?, ?, ?, ?, ?)")
+# NULL keeps the current value
+UPDATE_USAGE_FOR_USER = ("UPDATE usage SET amount = COALESCE(?, amount), "
+                         "usage_type = COALESCE(?, usage_type) "
+                         "WHERE id = ? AND user_id = ?")
+DELETE_USAGE = "DELETE FROM usage WHERE id = ?"
+DELETE_USAGE_FOR_USER = "DELETE FROM usage WHERE id = ? AND user_id = ?"
+
+
+def _usage_type_to_json(usage_type) -> str:
+    return UsageTypeModel.parse_obj(usage_type).json()
+
+
+def _row_to_usage(row: sqlite3.Row) -> dict:
+    return {
+        "_id": ObjectId(row["id"]),
+        "user_id": row["user_id"],
+        "amount": row["amount"],
+        "usage_type": json.loads(row["usage_type"]),
+        "usage_at": datetime.fromisoformat(row["usage_at"]),
+    }
+
+
+class SQLiteUsageStorage(BaseUsageStorage):
+    """Storage engine using an embedded SQLite database"""
+
+    def __init__(self, path: str, workers: int = 4):
+        self.path = path
+        self._local = threading.local()
+        # all connections handed out to the worker threads, see close()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="sqlite"
+        )
+        conn = self._connect()
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """connection of the current worker thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # blocking implementations, executed in the thread pool
+
+    def _get_usage_type(self, usage_type_id: int) -> Optional[dict]:
+        row = self._conn.execute(SELECT_USAGE_TYPE, (usage_type_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _get_all_usage_types(self, limit: int, offset: int) -> List[dict]:
+        rows = self._conn.execute(SELECT_USAGE_TYPES, (limit, offset))
+        return [dict(row) for row in rows]
+
+    def _add_usage_types(self, usage_types: List[dict]):
+        with self._conn as conn:
+            conn.executemany(INSERT_USAGE_TYPE, usage_types)
+
+    def _list_usages_for_user(self, user_id: str, limit: int,
+                              offset: int) -> List[dict]:
+        rows = self._conn.execute(SELECT_USAGES_FOR_USER,
+                                  (user_id, limit, offset))
+        return [_row_to_usage(row) for row in rows]
+
+    def _add_usage(self, usage_data: UsageStorageModel) -> dict:
+        id = str(ObjectId())
+        with self._conn as conn:
+            conn.execute(INSERT_USAGE, (
+                id,
+                usage_data.user_id,
+                usage_data.amount,
+                _usage_type_to_json(usage_data.usage_type),
+                usage_data.usage_at.isoformat(),
+            ))
+            row = conn.execute(SELECT_USAGE, (id,)).fetchone()
+        return _row_to_usage(row)
+
+    def _retrieve_usage(self, id: ObjectId, user_id: str) -> Optional[dict]:
+        row = self._conn.execute(SELECT_USAGE_FOR_USER,
+                                 (str(id), user_id)).fetchone()
+        return _row_to_usage(row) if row else None
+
+    def _update_usage(self, id: ObjectId, data: dict, user_id: str) -> dict:
+        data = get_update_set(data)
+        # missing fields become NULL, which keeps the current value
+        usage_type = data.get("usage_type")
+        if usage_type is not None:
+            usage_type = _usage_type_to_json(usage_type)
+        with self._conn as conn:
+            # ownership is checked by the UPDATE itself - a separate SELECT
+            # could race with a concurrent delete
+            updated = conn.execute(UPDATE_USAGE_FOR_USER, (
+                data.get("amount"), usage_type, str(id), user_id
+            )).rowcount
+            if not updated:
+                # usage not found in DB
+                raise ResourceNotFoundException("Resource not found in DB")
+            row = conn.execute(SELECT_USAGE, (str(id),)).fetchone()
+        return _row_to_usage(row)
+
+    def _delete_usage(self, id: ObjectId, user_id: str = None) -> int:
+        with self._conn as conn:
+            if user_id is None:
+                deleted = conn.execute(DELETE_USAGE, (str(id),)).rowcount
+            else:
+                deleted = conn.execute(DELETE_USAGE_FOR_USER,
+                                       (str(id), user_id)).rowcount
+        if not deleted:
+            raise ResourceNotFoundException("Resource not found in DB")
+        return deleted
+
+    # storage interface
+
+    async def get_usage_type(self, usage_type_id: int):
+        return await self._run(self._get_usage_type, usage_type_id)
+
+    async def get_all_usage_types(self, limit: int, offset: int):
+        return await self._run(self._get_all_usage_types, limit, offset)
+
+    async def add_usage_types(self, usage_types: List[dict]):
+        await self._run(self._add_usage_types, usage_types)
+
+    async def list_usages_for_user(self, user_id: int, limit: int, offset: int):
+        return await self._run(self._list_usages_for_user,
+                               str(user_id), limit, offset)
+
+    async def add_usage(self, usage_data: UsageStorageModel) -> dict:
+        return await self._run(self._add_usage, usage_data)
+
+    async def retrieve_usage(self, id: ObjectId, token: TokenData) -> dict:
+        return await self._run(self._retrieve_usage, id, token.user_id)
+
+    async def update_usage(self, id: ObjectId, data: dict,
+                           token: TokenData) -> dict:
+        return await self._run(self._update_usage, id, data, token.user_id)
+
+    async def delete_usage(self, id: ObjectId) -> int:
+        return await self._run(self._delete_usage, id)
+
+    async def delete_usage_for_user(self, id: ObjectId, token: TokenData):
+        return await self._run(self._delete_usage, id, token.user_id)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
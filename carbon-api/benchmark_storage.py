@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+"""
+This helper script measures the latency of the storage operations
+of the backend selected by STORAGE_BACKEND. The database has to be primed.
+
+    STORAGE_BACKEND=sqlite SQLITE_PATH=/tmp/bench.db python3 benchmark_storage.py
+"""
+os.environ.setdefault('MONGO_HOST', 'localhost')
+os.environ.setdefault('MONGO_PORT', '27017')
+
+# the api modules import each other by their plain names
+sys.path.append(os.path.join(os.path.dirname(__file__), 'api'))
+import db  # noqa: E402
+from models import TokenData, UsageStorageModel  # noqa: E402
+
+ROUNDS = int(os.getenv('BENCHMARK_ROUNDS', '1000'))
+
+
+async def measure(name: str, func, *args):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {elapsed / ROUNDS * 1e6:10.1f} us/op")
+
+
+async def main():
+    token = TokenData(user_id=f"benchuser_{uuid4()}")
+    usage_type = await db.get_usage_type(100)
+    if not usage_type:
+        print("[!] Usage type 100 not found - run prime_db.py first")
+        return
+    usage = UsageStorageModel(
+        amount=42, user_id=token.user_id,
+        usage_type=usage_type, usage_at=datetime.utcnow()
+    )
+    added = await db.add_usage(usage)
+
+    await measure("get_usage_type", db.get_usage_type, 100)
+    await measure("retrieve_usage", db.retrieve_usage, added["_id"], token)
+    await measure("list_usages_for_user", db.list_usages_for_user,
+                  token.user_id, 10, 0)
+    await measure("update_usage", db.update_usage, added["_id"],
+                  {"amount": 1}, token)
+    await measure("add_usage", db.add_usage, usage)
+
+
+if __name__ == "__main__":
+    print(f"[?] Benchmarking the {db.STORAGE_BACKEND} storage backend "
+          f"with {ROUNDS} rounds per operation")
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(
+        main()
+    )
+    print("[*]...done")
@@ -1,23 +1,17 @@
 import os
+import sys
 import asyncio
-# from bson.objectid import ObjectId
-import motor.motor_asyncio
 
 """
 This helper script adds default values
 to the database.
 """
-mongo_host = os.getenv('MONGO_HOST', 'localhost')
-mongo_port = int(os.getenv('MONGO_PORT', '27017'))
+os.environ.setdefault('MONGO_HOST', 'localhost')
+os.environ.setdefault('MONGO_PORT', '27017')
 
-DATABASE_URL = f"mongodb://{mongo_host}:{mongo_port}"
-
-client = motor.motor_asyncio.AsyncIOMotorClient(
-    DATABASE_URL,
-    uuidRepresentation="standard"
-)
-database = client.carbon
-usage_type_collection = database.get_collection("usage_type_collection")
+# the api modules import each other by their plain names
+sys.path.append(os.path.join(os.path.dirname(__file__), 'api'))
+import db  # noqa: E402
 
 type_data = [
     {
@@ -53,10 +47,10 @@ type_data = [
 ]
 
 async def insert_types():
-    return await usage_type_collection.insert_many(type_data)
+    return await db.add_usage_types(type_data)
 
 if __name__ == "__main__":
-    print(f"[?] Connected to database {DATABASE_URL}")
+    print(f"[?] Using the {db.STORAGE_BACKEND} storage backend")
     print(f"[*] Adding {len(type_data)} entries to the collection...")
     loop = asyncio.get_event_loop()
     loop.run_until_complete(
@@ -0,0 +1,83 @@
+"""
+Tests for the on-demand profiling middleware. These don't need a database.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# fix import
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from api.profiling import ProfilingMiddleware, PROFILING_HEADER
+
+
+def _make_client(**kwargs) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"msg": "pong"}
+
+    app.add_middleware(ProfilingMiddleware, token="s3cr3t", **kwargs)
+    return TestClient(app)
+
+
+class TestProfilingMiddleware(unittest.TestCase):
+
+    def test_not_profiled_without_header(self):
+        client = _make_client()
+        res = client.get("/ping")
+        self.assertEqual(res.json(), {"msg": "pong"})
+
+    def test_not_profiled_with_wrong_token(self):
+        client = _make_client()
+        res = client.get("/ping", headers={PROFILING_HEADER: "guess"})
+        self.assertEqual(res.json(), {"msg": "pong"})
+
+    def test_not_profiled_with_non_ascii_token(self):
+        client = _make_client()
+        res = client.get("/ping", headers={PROFILING_HEADER: "\xe9"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {"msg": "pong"})
+
+    def test_profile_returned(self):
+        client = _make_client()
+        res = client.get("/ping", headers={PROFILING_HEADER: "s3cr3t"})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.headers["content-type"].startswith("text/html"))
+
+    def test_rate_limited(self):
+        client = _make_client(min_interval=3600)
+        headers = {PROFILING_HEADER: "s3cr3t"}
+        client.get("/ping", headers=headers)
+        # the second request within the interval is served normally
+        res = client.get("/ping", headers=headers)
+        self.assertEqual(res.json(), {"msg": "pong"})
+
+    def test_profile_stored(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            client = _make_client(output_dir=output_dir)
+            res = client.get("/ping", headers={PROFILING_HEADER: "s3cr3t"})
+            self.assertEqual(res.json(), {"msg": "pong"})
+            profile_id = res.headers["X-Profile-Id"]
+            self.assertTrue(os.path.exists(
+                os.path.join(output_dir, f"{profile_id}.html")))
+
+    def test_profile_store_failure(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_dir = os.path.join(tmpdir, "profiles")
+            client = _make_client(output_dir=output_dir, min_interval=0)
+            self.assertTrue(os.path.isdir(output_dir))
+            os.rmdir(output_dir)
+            # the request is served normally, just without a profile
+            res = client.get("/ping", headers={PROFILING_HEADER: "s3cr3t"})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json(), {"msg": "pong"})
+            self.assertNotIn("X-Profile-Id", res.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
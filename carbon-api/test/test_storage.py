@@ -0,0 +1,179 @@
+"""
+Tests the storage engines against the same set of expectations.
+SQLite always runs, MongoDB only if MONGO_HOST is set in the environment.
+"""
+import os
+import sys
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from uuid import uuid4
+from bson.objectid import ObjectId
+
+# fix import - the api modules import each other by their plain names
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from errors import ResourceNotFoundException
+from models import (TokenData, UsageStorageModel, UsageResponseModel,
+                    UsageTypeModel)
+from storage import BaseUsageStorage
+from storage_sqlite import SQLiteUsageStorage
+
+type_data = [
+    {"id": 100, "name": "electricity", "unit": "kwh", "factor": 1.5},
+    {"id": 101, "name": "water", "unit": "kg", "factor": 26.93},
+]
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class StorageContract:
+    """Expectations every storage engine has to meet"""
+
+    def make_storage(self):
+        raise NotImplementedError()
+
+    def setUp(self) -> None:
+        self.storage = self.make_storage()
+        self.token = TokenData(user_id=f"testuser_{uuid4()}")
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.storage.close()
+        return super().tearDown()
+
+    def _add(self, amount=42, usage_type=None, token=None):
+        usage = UsageStorageModel(
+            amount=amount,
+            user_id=(token or self.token).user_id,
+            usage_type=usage_type or type_data[0],
+            usage_at=datetime.utcnow(),
+        )
+        return run(self.storage.add_usage(usage))
+
+    def test_get_usage_type(self):
+        usage_type = run(self.storage.get_usage_type(101))
+        self.assertEqual(UsageTypeModel.parse_obj(usage_type).name, "water")
+        self.assertIsNone(run(self.storage.get_usage_type(1)))
+
+    def test_get_all_usage_types(self):
+        types = run(self.storage.get_all_usage_types(1, 0))
+        self.assertEqual(len(types), 1)
+
+    def test_add_and_retrieve(self):
+        added = self._add()
+        self.assertIsInstance(UsageResponseModel.parse_obj(added),
+                              UsageResponseModel)
+        retrieved = run(self.storage.retrieve_usage(added["_id"], self.token))
+        self.assertEqual(retrieved["_id"], added["_id"])
+        self.assertEqual(retrieved["usage_type"]["id"], 100)
+
+    def test_retrieve_foreign(self):
+        added = self._add()
+        mallory = TokenData(user_id=f"testuser_{uuid4()}")
+        self.assertIsNone(run(self.storage.retrieve_usage(added["_id"], mallory)))
+
+    def test_list_usages_for_user(self):
+        for i in range(5):
+            self._add(amount=i)
+        usages = run(self.storage.list_usages_for_user(
+            self.token.user_id, 3, 1))
+        self.assertEqual([u["amount"] for u in usages], [1, 2, 3])
+
+    def test_update_usage(self):
+        added = self._add()
+        updated = run(self.storage.update_usage(
+            added["_id"], {"amount": None, "usage_type": type_data[1]},
+            self.token))
+        self.assertEqual(updated["amount"], 42)
+        self.assertEqual(updated["usage_type"]["id"], 101)
+
+    def test_update_foreign(self):
+        added = self._add()
+        mallory = TokenData(user_id=f"testuser_{uuid4()}")
+        with self.assertRaises(ResourceNotFoundException):
+            run(self.storage.update_usage(added["_id"], {"amount": 1}, mallory))
+
+    def test_update_unsupported_field(self):
+        added = self._add()
+        with self.assertRaises(ValueError):
+            run(self.storage.update_usage(
+                added["_id"], {"amount": 1, "user_id": "mallory"},
+                self.token))
+        retrieved = run(self.storage.retrieve_usage(added["_id"], self.token))
+        self.assertEqual(retrieved["amount"], 42)
+
+    def test_update_deleted(self):
+        added = self._add()
+        run(self.storage.delete_usage(added["_id"]))
+        with self.assertRaises(ResourceNotFoundException):
+            run(self.storage.update_usage(added["_id"], {"amount": 1},
+                                          self.token))
+
+    def test_delete_usage(self):
+        added = self._add()
+        self.assertEqual(run(self.storage.delete_usage(added["_id"])), 1)
+        self.assertIsNone(run(self.storage.retrieve_usage(added["_id"],
+                                                          self.token)))
+        with self.assertRaises(ResourceNotFoundException):
+            run(self.storage.delete_usage(ObjectId()))
+
+    def test_delete_usage_for_user(self):
+        added = self._add()
+        mallory = TokenData(user_id=f"testuser_{uuid4()}")
+        with self.assertRaises(ResourceNotFoundException):
+            run(self.storage.delete_usage_for_user(added["_id"], mallory))
+        self.assertEqual(
+            run(self.storage.delete_usage_for_user(added["_id"], self.token)),
+            1)
+
+
+class TestSQLiteStorage(StorageContract, unittest.TestCase):
+
+    def make_storage(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        storage = SQLiteUsageStorage(os.path.join(self.tmpdir.name, "test.db"))
+        run(storage.add_usage_types(type_data))
+        return storage
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self.tmpdir.cleanup()
+
+    def test_close_closes_connections(self):
+        self._add()
+        connections = list(self.storage._connections)
+        self.assertTrue(connections)
+        self.storage.close()
+        for conn in connections:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+
+
+class TestBaseUsageStorage(unittest.TestCase):
+
+    def test_incomplete_backend(self):
+        class IncompleteStorage(BaseUsageStorage):
+            async def get_usage_type(self, usage_type_id: int):
+                return None
+
+        with self.assertRaises(TypeError):
+            IncompleteStorage()
+
+
+@unittest.skipUnless(os.getenv("MONGO_HOST"), "MONGO_HOST is not set")
+class TestMongoStorage(StorageContract, unittest.TestCase):
+    """Runs against the primed test database, like test_api"""
+
+    def make_storage(self):
+        from storage_mongo import MongoUsageStorage
+        port = os.getenv("MONGO_PORT", "27017")
+        return MongoUsageStorage(f"mongodb://{os.getenv('MONGO_HOST')}:{port}")
+
+
+if __name__ == "__main__":
+    unittest.main()
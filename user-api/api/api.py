@@ -1,10 +1,12 @@
 import os
 import motor.motor_asyncio
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_users import FastAPIUsers, models
 from fastapi_users.authentication import JWTAuthentication
-from fastapi_users.db import MongoDBUserDatabase
+
+from db import CachedMongoDBUserDatabase, get_create_user
+from password import metrics
 
 
 mongo_host = os.getenv('MONGO_HOST')
@@ -45,7 +47,7 @@ client = motor.motor_asyncio.AsyncIOMotorClient(
 )
 db = client["database_name"]
 collection = db["users"]
-user_db = MongoDBUserDatabase(UserDB, collection)
+user_db = CachedMongoDBUserDatabase(UserDB, collection)
 
 
 def on_after_register(user: UserDB, request: Request):
@@ -88,6 +90,8 @@ fastapi_users = FastAPIUsers(
     UserUpdate,
     UserDB,
 )
+# hash passwords of new users off the event loop
+fastapi_users.create_user = get_create_user(user_db, UserDB)
 app.include_router(
     fastapi_users.get_auth_router(jwt_authentication), prefix="/auth/jwt", tags=["auth"]
 )
@@ -109,3 +113,9 @@ app.include_router(
     tags=["auth"],
 )
 app.include_router(fastapi_users.get_users_router(), prefix="/users", tags=["users"])
+
+
+@app.get("/metrics/auth", tags=["metrics"])
+async def auth_metrics(user: UserDB = Depends(fastapi_users.get_current_superuser)):
+    """Login throughput and password hashing statistics of this worker"""
+    return metrics.snapshot()
@@ -0,0 +1,192 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Type
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import models
+from fastapi_users.db import MongoDBUserDatabase
+from fastapi_users.models import UD
+from fastapi_users.user import CreateUserProtocol, UserAlreadyExists
+from pydantic import UUID4
+
+import password
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+
+class TTLCache:
+    """Tiny LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+
+class CachedMongoDBUserDatabase(MongoDBUserDatabase[UD]):
+    """MongoDB adapter with a short-lived cache for lookups by id and email.
+
+    Cache entries are dropped whenever a user is written through this
+    adapter. Writes done by other workers are only picked up after the
+    TTL expired, so keep it short.
+    Password verification is run in a thread pool, see `password`.
+    """
+
+    def __init__(self, *args, cache_ttl: float = USER_CACHE_TTL,
+                 cache_size: int = USER_CACHE_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_ttl = cache_ttl
+        self._by_id = TTLCache(cache_ttl, cache_size)
+        self._by_email = TTLCache(cache_ttl, cache_size)
+        # bumped on every invalidation. A read only fills the cache if no
+        # invalidation happened while it was waiting for the database -
+        # otherwise it could cache a user that was just changed. A single
+        # counter also covers lookups by an email the user no longer has.
+        self._generation = 0
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        # emails are matched case insensitive in mongo
+        return email.casefold()
+
+    def _remember(self, user: UD):
+        self._by_id.set(user.id, user.copy(deep=True))
+        self._by_email.set(self._email_key(user.email), user.copy(deep=True))
+
+    def _forget(self, user: UD):
+        self._generation += 1
+        cached = self._by_id.pop(user.id)
+        if cached:
+            self._by_email.pop(self._email_key(cached.email))
+        self._by_email.pop(self._email_key(user.email))
+
+    async def get(self, id: UUID4) -> Optional[UD]:
+        if self.cache_ttl <= 0:
+            return await super().get(id)
+        cached = self._by_id.get(id)
+        if cached:
+            # routers modify the returned user in place - never hand out
+            # the cached instance
+            return cached.copy(deep=True)
+        generation = self._generation
+        user = await super().get(id)
+        if user and generation == self._generation:
+            self._remember(user)
+        return user
+
+    async def get_by_email(self, email: str) -> Optional[UD]:
+        if self.cache_ttl <= 0:
+            return await super().get_by_email(email)
+        cached = self._by_email.get(self._email_key(email))
+        if cached:
+            return cached.copy(deep=True)
+        generation = self._generation
+        user = await super().get_by_email(email)
+        if user and generation == self._generation:
+            self._remember(user)
+        return user
+
+    async def create(self, user: UD) -> UD:
+        self._forget(user)
+        return await super().create(user)
+
+    async def update(self, user: UD) -> UD:
+        self._forget(user)
+        try:
+            return await super().update(user)
+        finally:
+            # drop what a read finishing during the write may have cached
+            self._forget(user)
+
+    async def delete(self, user: UD) -> None:
+        self._forget(user)
+        await super().delete(user)
+
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[UD]:
+        """Same as `BaseUserDatabase.authenticate`, but without blocking
+        the event loop while hashing."""
+        password.metrics.login_started()
+        user = None
+        try:
+            user = await self._authenticate(credentials)
+        finally:
+            password.metrics.login_finished(success=user is not None)
+        return user
+
+    async def _authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[UD]:
+        # always read through: a password changed on another worker must
+        # not keep working, and unknown and known emails should take the
+        # same path to the database (timing)
+        user = await super().get_by_email(credentials.username)
+
+        if user is None:
+            # Run the hasher to mitigate timing attack
+            await password.get_password_hash(credentials.password)
+            return None
+
+        verified, updated_password_hash = \
+            await password.verify_and_update_password(
+                credentials.password, user.hashed_password
+            )
+        if not verified:
+            return None
+        # Update password hash to a more robust one if needed
+        if updated_password_hash is not None:
+            user.hashed_password = updated_password_hash
+            await self.update(user)
+
+        return user
+
+
+def get_create_user(
+    user_db: MongoDBUserDatabase,
+    user_db_model: Type[models.BaseUserDB],
+) -> CreateUserProtocol:
+    """Replacement for `fastapi_users.user.get_create_user` that hashes the
+    password in the thread pool."""
+    async def create_user(
+        user: models.BaseUserCreate,
+        safe: bool = False,
+        is_active: bool = None,
+        is_verified: bool = None,
+    ) -> models.BaseUserDB:
+        existing_user = await user_db.get_by_email(user.email)
+
+        if existing_user is not None:
+            raise UserAlreadyExists()
+
+        hashed_password = await password.get_password_hash(user.password)
+        user_dict = (
+            user.create_update_dict() if safe
+            else user.create_update_dict_superuser()
+        )
+        db_user = user_db_model(**user_dict, hashed_password=hashed_password)
+        return await user_db.create(db_user)
+
+    return create_user
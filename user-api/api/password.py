@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi_users import password as fastapi_users_password
+
+"""
+bcrypt is slow on purpose. fastapi-users runs it directly on the event loop,
+which blocks every other request on the worker. The helpers here run it in
+a bounded thread pool instead (bcrypt releases the GIL while hashing).
+They are used for login and registration only - the reset password and
+update user routers of fastapi-users still hash on the event loop.
+"""
+
+HASHING_WORKERS = int(os.getenv("HASHING_WORKERS", "4"))
+# logins_per_second is computed over this many recent seconds
+LOGIN_RATE_WINDOW = float(os.getenv("LOGIN_RATE_WINDOW", "60"))
+
+executor = ThreadPoolExecutor(
+    max_workers=HASHING_WORKERS, thread_name_prefix="password-hashing"
+)
+
+
+class LoginMetrics:
+    """Simple in-process counters for login throughput"""
+
+    def __init__(self, rate_window: float = LOGIN_RATE_WINDOW):
+        self.started_at = time.monotonic()
+        self.rate_window = rate_window
+        # completion times of the logins within the rate window
+        self._finished_at = deque()
+        self.logins_total = 0
+        self.logins_failed = 0
+        self.hashing_seconds_total = 0.0
+        self.queue_wait_seconds_total = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # hashing is recorded from the worker threads
+        self._lock = threading.Lock()
+
+    def hashing_finished(self, queue_wait: float, hashing: float):
+        with self._lock:
+            self.queue_wait_seconds_total += queue_wait
+            self.hashing_seconds_total += hashing
+
+    def login_started(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def login_finished(self, success: bool):
+        self.in_flight -= 1
+        self.logins_total += 1
+        if not success:
+            self.logins_failed += 1
+        now = time.monotonic()
+        self._finished_at.append(now)
+        self._expire(now)
+
+    def _expire(self, now: float):
+        while self._finished_at and self._finished_at[0] < now - self.rate_window:
+            self._finished_at.popleft()
+
+    def logins_per_second(self) -> float:
+        """Login rate over the last `rate_window` seconds"""
+        now = time.monotonic()
+        self._expire(now)
+        # right after startup, the window is not full yet
+        window = min(self.rate_window, now - self.started_at)
+        return len(self._finished_at) / window if window > 0 else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "hashing_workers": HASHING_WORKERS,
+            "logins_total": self.logins_total,
+            "logins_failed": self.logins_failed,
+            "logins_per_second": self.logins_per_second(),
+            "login_rate_window_seconds": self.rate_window,
+            "hashing_seconds_total": self.hashing_seconds_total,
+            "queue_wait_seconds_total": self.queue_wait_seconds_total,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+metrics = LoginMetrics()
+
+
+def _timed(func, submitted_at: float, *args):
+    """Runs in the worker - keeps time spent queued apart from hashing"""
+    started_at = time.monotonic()
+    try:
+        return func(*args)
+    finally:
+        metrics.hashing_finished(queue_wait=started_at - submitted_at,
+                                 hashing=time.monotonic() - started_at)
+
+
+async def _run_in_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, _timed, func, time.monotonic(), *args
+    )
+
+
+async def get_password_hash(plain_password: str) -> str:
+    return await _run_in_pool(
+        fastapi_users_password.get_password_hash, plain_password
+    )
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    return await _run_in_pool(
+        fastapi_users_password.verify_and_update_password,
+        plain_password, hashed_password
+    )
@@ -0,0 +1,234 @@
+"""
+Tests the user cache and the offloaded password hashing.
+The MongoDB collection is replaced by an in-memory fake, so no database
+is needed.
+"""
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import models
+from fastapi_users.password import get_password_hash
+from fastapi_users.user import UserAlreadyExists
+
+# fix import - the api modules import each other by their plain names
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from db import TTLCache, CachedMongoDBUserDatabase, get_create_user
+from password import metrics, LoginMetrics
+
+
+class User(models.BaseUser):
+    pass
+
+
+class UserCreate(models.BaseUserCreate):
+    pass
+
+
+class UserDB(User, models.BaseUserDB):
+    pass
+
+
+class FakeCollection:
+    """Just enough of a motor collection for MongoDBUserDatabase"""
+
+    def __init__(self):
+        self.documents = []
+        self.find_one_calls = 0
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def _matches(self, document, query, collation):
+        for key, value in query.items():
+            if collation and isinstance(value, str):
+                if document[key].casefold() != value.casefold():
+                    return False
+            elif document[key] != value:
+                return False
+        return True
+
+    async def find_one(self, query, collation=None):
+        self.find_one_calls += 1
+        for document in self.documents:
+            if self._matches(document, query, collation):
+                return dict(document)
+        return None
+
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    async def replace_one(self, query, document):
+        self.documents = [dict(document) if self._matches(d, query, None)
+                          else d for d in self.documents]
+
+    async def delete_one(self, query):
+        self.documents = [d for d in self.documents
+                          if not self._matches(d, query, None)]
+
+
+class SlowFakeCollection(FakeCollection):
+    """find_one returns what was stored when it was called, but only
+    once `release` is set - like a slow read racing a write"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = None
+
+    async def find_one(self, query, collation=None):
+        document = await super().find_one(query, collation)
+        if self.release is not None:
+            await self.release.wait()
+        return document
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_expiry(self):
+        cache = TTLCache(ttl=30, maxsize=10)
+        with mock.patch("db.time.monotonic", return_value=100):
+            cache.set("key", "value")
+        with mock.patch("db.time.monotonic", return_value=129):
+            self.assertEqual(cache.get("key"), "value")
+        with mock.patch("db.time.monotonic", return_value=131):
+            self.assertIsNone(cache.get("key"))
+
+    def test_maxsize_evicts_least_recently_used(self):
+        cache = TTLCache(ttl=30, maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+
+class TestCachedMongoDBUserDatabase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.collection = FakeCollection()
+        self.user_db = CachedMongoDBUserDatabase(UserDB, self.collection)
+        self.user = UserDB(email="alice@example.com",
+                           hashed_password=get_password_hash("secret"))
+        run(self.user_db.create(self.user))
+        return super().setUp()
+
+    def test_cache_hit(self):
+        run(self.user_db.get(self.user.id))
+        run(self.user_db.get(self.user.id))
+        run(self.user_db.get_by_email("ALICE@example.com"))
+        self.assertEqual(self.collection.find_one_calls, 1)
+
+    def test_cache_returns_copies(self):
+        user = run(self.user_db.get(self.user.id))
+        user.email = "mallory@example.com"
+        cached = run(self.user_db.get(self.user.id))
+        self.assertEqual(cached.email, "alice@example.com")
+
+    def test_update_invalidates(self):
+        user = run(self.user_db.get(self.user.id))
+        run(self.user_db.get_by_email("alice@example.com"))
+        user.email = "bob@example.com"
+        run(self.user_db.update(user))
+
+        self.assertEqual(run(self.user_db.get(self.user.id)).email,
+                         "bob@example.com")
+        self.assertIsNone(run(self.user_db.get_by_email("alice@example.com")))
+        self.assertEqual(
+            run(self.user_db.get_by_email("bob@example.com")).id,
+            self.user.id)
+
+    def test_update_during_read(self):
+        collection = SlowFakeCollection()
+        user_db = CachedMongoDBUserDatabase(UserDB, collection)
+        run(user_db.create(self.user))
+
+        async def race():
+            collection.release = asyncio.Event()
+            # the read starts before the update and ends after it
+            read = asyncio.ensure_future(user_db.get(self.user.id))
+            await asyncio.sleep(0)
+            user = self.user.copy()
+            user.is_active = False
+            await user_db.update(user)
+            collection.release.set()
+            stale = await read
+            collection.release = None
+            return stale
+
+        self.assertTrue(run(race()).is_active)
+        # the old version must not have made it into the cache
+        self.assertFalse(run(user_db.get(self.user.id)).is_active)
+
+    def test_authenticate_reads_through(self):
+        run(self.user_db.get_by_email("alice@example.com"))
+        calls = self.collection.find_one_calls
+        credentials = OAuth2PasswordRequestForm(
+            username="alice@example.com", password="secret", scope="")
+        run(self.user_db.authenticate(credentials))
+        self.assertEqual(self.collection.find_one_calls, calls + 1)
+
+    def test_delete_invalidates(self):
+        run(self.user_db.get(self.user.id))
+        run(self.user_db.get_by_email("alice@example.com"))
+        run(self.user_db.delete(self.user))
+
+        self.assertIsNone(run(self.user_db.get(self.user.id)))
+        self.assertIsNone(run(self.user_db.get_by_email("alice@example.com")))
+
+    def test_authenticate_metrics(self):
+        logins_total = metrics.logins_total
+        logins_failed = metrics.logins_failed
+        hashing_seconds = metrics.hashing_seconds_total
+
+        ok = OAuth2PasswordRequestForm(username="alice@example.com",
+                                       password="secret", scope="")
+        wrong = OAuth2PasswordRequestForm(username="alice@example.com",
+                                          password="wrong", scope="")
+        self.assertEqual(run(self.user_db.authenticate(ok)).id, self.user.id)
+        self.assertIsNone(run(self.user_db.authenticate(wrong)))
+
+        self.assertEqual(metrics.logins_total, logins_total + 2)
+        self.assertEqual(metrics.logins_failed, logins_failed + 1)
+        self.assertGreater(metrics.hashing_seconds_total, hashing_seconds)
+        self.assertEqual(metrics.in_flight, 0)
+
+    def test_create_user_already_exists(self):
+        create_user = get_create_user(self.user_db, UserDB)
+        with self.assertRaises(UserAlreadyExists):
+            run(create_user(UserCreate(email="alice@example.com",
+                                       password="secret")))
+
+    def test_create_user(self):
+        create_user = get_create_user(self.user_db, UserDB)
+        user = run(create_user(UserCreate(email="bob@example.com",
+                                          password="secret"), safe=True))
+        self.assertEqual(run(self.user_db.get(user.id)).email,
+                         "bob@example.com")
+
+
+class TestLoginMetrics(unittest.TestCase):
+
+    def test_logins_per_second_over_window(self):
+        with mock.patch("password.time.monotonic", return_value=0):
+            login_metrics = LoginMetrics(rate_window=60)
+        # 30 logins long ago and 30 within the last minute
+        for now in [10] * 30 + [200] * 30:
+            with mock.patch("password.time.monotonic", return_value=now):
+                login_metrics.login_started()
+                login_metrics.login_finished(success=True)
+        with mock.patch("password.time.monotonic", return_value=230):
+            self.assertEqual(login_metrics.logins_per_second(), 0.5)
+            self.assertEqual(login_metrics.snapshot()["logins_total"], 60)
+
+
+if __name__ == "__main__":
+    unittest.main()